@@ -13,49 +13,120 @@ if they fall within the viewport. If not, we do VertexList.delete,
 else, we add to the batch.
 """
 
+if __name__ == '__main__':
+    # hand over to cli.py before anything below imports pyglet.gl, so it can still
+    # choose headless rendering; it imports this file once more as the Miners module
+    from cli import main
+
+    raise SystemExit(main())
+
+from random import seed as seed_random, randrange
+from typing import Optional
+
 import pyglet
 
-from board import Board
+from board import Board, TILE_VERTICES
 from camera import Camera
-from common import global_timer
+from common import global_timer, global_stats
 from graph import Graph
+from replay import InputRecorder, InputPlayer, FrameLog
+from snapshot import Snapshotter
 
 
 class Simulation:
-    def __init__(self, width, height, framerate):
+    def __init__(
+            self, width, height, framerate,
+            save_file: Optional[str] = None, autosave: float = 30.,
+            seed: Optional[int] = None, headless: bool = False,
+            record_file: Optional[str] = None, replay_file: Optional[str] = None,
+            frames_file: Optional[str] = None, stats_file: Optional[str] = None,
+            workers: int = 0, chunks: int = 5, chunk_budget: int = 4,
+            ticks: Optional[int] = None
+    ):
         self.width = width
         self.height = height
         self.framerate = framerate
+        self.headless = headless
+        # stop after this many ticks, run until closed when None
+        self.ticks = ticks
+        self.tick = 0
+
+        # a replay dictates the seed, everything random in the world derives from it
+        self.player: Optional[InputPlayer] = None
+        if replay_file is not None:
+            self.player = InputPlayer(replay_file)
+            seed = self.player.seed
+        elif seed is None:
+            seed = randrange(1 << 63)
+        self.seed = seed
+        seed_random(seed)
+
+        self.recorder: Optional[InputRecorder] = None
+        if record_file is not None:
+            self.recorder = InputRecorder(record_file, seed, framerate)
+
+        self.frames = FrameLog()
+        self.frames_file = frames_file
+        self.stats_file = stats_file
 
         self.window = pyglet.window.Window(
             width=self.width, height=self.height,
-            vsync=True,
+            vsync=not headless, visible=not headless,
         )
         # self.fps = pyglet.window.FPSDisplay(self.window)
         self.fps = Graph(0, height - 100, 200, 100, 2, 2, 60, 60.)
+        # a chunk uploads at most its budget of tiles per frame, and the
+        # maximum is never zero or the graph would divide by it
+        self.uploads = Graph(0, height - 220, 200, 100, 2, 2, 60, max(chunk_budget, 1) * TILE_VERTICES)
 
         self.keys = pyglet.window.key.KeyStateHandler()
         self.window.push_handlers(self.keys)
         self.window.push_handlers(self.on_draw)
 
         self.batch = pyglet.graphics.Batch()
-        self.camera = Camera(10)
-        self.gui_camera = Camera(10)
+        self.camera = Camera(10, width=width, height=height)
+        self.gui_camera = Camera(10, width=width, height=height)
         self.position_label = pyglet.text.Label(
             "x=0, y=0", font_name="consolas",
             x=2, y=self.height - 118
         )
 
-        self.board = Board(self.batch, self.camera, self.width, self.height)
+        self.board = Board(
+            self.batch, self.camera, self.width, self.height,
+            workers, seed, chunks, chunk_budget
+        )
+
+        self.snapshots: Optional[Snapshotter] = None
+        if save_file is not None:
+            self.snapshots = Snapshotter(save_file, autosave)
+            self.snapshots.load(self.board)
 
     def update(self, dt: float):
-        dx = self.keys[pyglet.window.key.D] - self.keys[pyglet.window.key.A]
-        dy = self.keys[pyglet.window.key.W] - self.keys[pyglet.window.key.S]
+        if self.ticks is not None and self.tick >= self.ticks:
+            pyglet.app.exit()
+            return
+        self.tick += 1
+
+        if self.player is not None:
+            if self.player.finished:
+                pyglet.app.exit()
+                return
+            dx, dy, dt = self.player.next()
+        else:
+            dx = self.keys[pyglet.window.key.D] - self.keys[pyglet.window.key.A]
+            dy = self.keys[pyglet.window.key.W] - self.keys[pyglet.window.key.S]
+
+        if self.recorder is not None:
+            self.recorder.record(dx, dy, dt)
+
+        self.frames.begin()
         self.camera.move(dx, dy)
         x, y = self.camera.position
         self.position_label.text = f"x={x}, y={y}"
 
         self.board.update(dt)
+        if self.snapshots is not None:
+            self.snapshots.update(self.board, dt)
         self.fps.push(1/dt)
         self.fps.update(dt)
 
@@ -68,6 +139,17 @@ class Simulation:
             self.position_label.draw()
             self.gui_camera.rectangle.scale(-200., -200.).draw()
             self.fps.draw()
+            self.uploads.draw()
+
+        # the batch draws each vertex domain of each group once, plus our four gui draws
+        global_stats.count("draw_calls", sum(
+            len(domains) for domains in self.batch.group_map.values()
+        ) + 4)
+        global_stats.end_frame()
+        global_stats.plot(self.uploads, "vertices_uploaded")
+        self.uploads.update(0.)
+
+        self.frames.end()
 
     def setup(self):
         pyglet.clock.schedule_interval(
@@ -75,10 +157,38 @@ class Simulation:
         )
 
     def run(self):
-        self.setup()
-        pyglet.app.run()
-
-
-if __name__ == '__main__':
-    sim = Simulation(800, 640, 60.)
-    sim.run()
+        if self.headless:
+            self.run_headless()
+        else:
+            self.setup()
+            pyglet.app.run()
+        self.close()
+
+    def run_headless(self):
+        """Tick and draw as fast as possible until the replay or the tick limit runs out."""
+        if self.player is None and self.ticks is None:
+            raise ValueError("a headless run needs a replay or a tick count")
+
+        dt = 1. / self.framerate
+        while self.ticks is None or self.tick < self.ticks:
+            if self.player is not None and self.player.finished:
+                break
+
+            self.update(dt)
+            self.on_draw()
+
+    def close(self):
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.frames_file is not None:
+            self.frames.save(self.frames_file)
+        if self.stats_file is not None:
+            global_stats.dump(self.stats_file)
+
+        try:
+            if self.snapshots is not None:
+                self.snapshots.save(self.board)
+                self.snapshots.close()
+        finally:
+            # free the shared block memory even when the last save fails
+            self.board.close()
@@ -1,35 +1,64 @@
 from collections import deque
 from dataclasses import dataclass
-from random import random, randrange
-from typing import Optional, Tuple, List, Deque, Set, Union
+from random import random
+from typing import Optional, Tuple, List, Deque, Set, Union, Iterator, Callable
 
 from math import atan2, tau
 from pyglet.graphics import OrderedGroup, Batch
 from pyglet.graphics.vertexdomain import VertexList
 
 from camera import Camera
-from common import global_timer, GRID_SIZE
+from common import global_timer, global_stats, GRID_SIZE, CHUNK_WIDTH
 from intersections import Rectangle
+from pathfinding import Pathfinder
+from regions import RegionLabels
 from shapes import line_quad, quad
+from shards import ShardPool, SharedBlocks, chunk_keys
+from storage import BlockStorage
 
 
+# bytes per vertex of the vertex lists we upload
+BLOCK_VERTEX_SIZE = 4 * 4 + 3  # v4f, c3B
+BORDER_VERTEX_SIZE = 4 * 4     # v4f
+# vertices uploaded for one 4x4 tile of blocks, the unit of Chunk.process's budget
+TILE_VERTICES = 16 * 4
+
 BLOCKS = OrderedGroup(0)
 MINERS = OrderedGroup(1)
 BORDER = OrderedGroup(2)
 
+# observer(chunk name, block index, old key, new key), index -1 when the whole chunk was replaced
+BlockObserver = Callable[[int, int, int, int], None]
+
 
 @dataclass
 class Block:
     broken: bool = False
     value: int = 0
 
+    @property
+    def key(self) -> int:
+        """Pack the block into the integer stored by BlockStorage."""
+        return (self.value << 1) | self.broken
+
+    @classmethod
+    def from_key(cls, key: int) -> "Block":
+        return cls(bool(key & 1), key >> 1)
+
 
 class Chunk:
     BLOCK_SHAPE = quad
     # BLOCK_SHAPE = line_quad
 
-    def __init__(self, name: int, offset: Tuple[float, float]):
-        self.blocks: List[Block] = [Block(value=randrange(3)) for _ in range(256)]
+    def __init__(
+            self, name: int, offset: Tuple[float, float],
+            blocks: Union[BlockStorage, SharedBlocks, None] = None,
+            observers: Optional[List[BlockObserver]] = None
+    ):
+        if blocks is None:
+            blocks = BlockStorage.from_keys(chunk_keys(0, name))
+        self.blocks: Union[BlockStorage, SharedBlocks] = blocks
+        self.observers: List[BlockObserver] = [] if observers is None else observers
         self.vbos: List[Optional[VertexList]] = [None for _ in range(256)]
         self.name = name
         self.offset = offset
@@ -43,21 +72,41 @@ class Chunk:
         x, y = self.offset
         return f"Chunk({self.name:d}, ({x:f}, {y:f}))"
 
+    def __getitem__(self, index: int) -> Block:
+        # blocks are decoded on read, so changes must be written back through __setitem__
+        return Block.from_key(self.blocks[index])
+
+    def __setitem__(self, index: int, block: Block):
+        old, new = self.blocks[index], block.key
+        self.blocks[index] = new
+
+        if old != new:
+            for observer in self.observers:
+                observer(self.name, index, old, new)
+
     def hide(self):
         # print(f"disabling the chunk {self.name}")
 
         if not self.visible:
+            deleted = 0
             for i in range(256):
                 vbo = self.vbos[i]
                 if vbo is not None:
                     self.vbos[i].delete()
                     self.vbos[i] = None
+                    deleted += 1
 
             self.show_queue.clear()
 
             if self.bound is not None:
                 self.bound.delete()
                 self.bound = None
+                deleted += 1
+
+            global_stats.count("vertex_lists_deleted", deleted)
+
+            # off-screen chunks are only cached, so shrink them to their smallest palette
+            self.blocks.compact()
 
     def show(self, batch: Batch, view_box: Rectangle):
         # print(f"enabling the chunk {self.name}")
@@ -132,19 +181,21 @@ class Chunk:
                     ).flatten()
                 )
             )
+            global_stats.uploaded(4, BORDER_VERTEX_SIZE)
 
-    def process(self, batch: Batch) -> bool:
+    def process(self, batch: Batch, budget: int = 4) -> bool:
+        """Upload up to budget of the queued 4x4 tiles, returning True once the queue is empty."""
         if not len(self.show_queue):
             return True
 
         scale = GRID_SIZE
         ox, oy = self.offset
-        for _ in range(4):
+        for _ in range(min(budget, len(self.show_queue))):
             i, j = self.show_queue.popleft()
             for n in range(4):
                 for m in range(4):
                     index = (j * 64) + (i * 16) + (n * 4) + m
-                    # value = self.blocks[index].value
+                    # value = self[index].value
                     group = BLOCKS
                     # group = GROUPS[value]
                     self.vbos[index] = self.BLOCK_SHAPE.add_to_batch(
@@ -157,6 +208,7 @@ class Chunk:
                         ('c3B/static', [0x3e, 0x41, 0x4e] * 4)
                         # ("t3f", TEXTURES[value].tex_coords)
                     )
+                    global_stats.uploaded(4, BLOCK_VERTEX_SIZE)
 
         return False
 
@@ -175,13 +227,22 @@ class ChunkGrid:
         chunk: int
         finished: bool = False
 
-    def __init__(self, initial_width, initial_height):
+    def __init__(
+            self, initial_width, initial_height,
+            workers: int = 0, seed: int = 0,
+            size: int = 5, budget: int = 4
+    ):
         self.chunks: List[Chunk] = []
 
         w2 = initial_width / 2
         h2 = initial_height / 2
         cx = cy = 16 * GRID_SIZE
-        xr = yr = 5
+        xr = yr = size
+        self.columns = xr
+        self.rows = yr
+
+        # shared by every chunk and the shard pool, notified when a block changes
+        self.observers: List[BlockObserver] = []
 
         # self.chunks = [
         #     Chunk(0, (offset_x0, offset_y0)),
@@ -191,14 +252,24 @@ class ChunkGrid:
         #     Chunk(n, (w2 + cx * (n - xr / 2, h2 + cy * (n - xr / 2))
         # ]
 
+        # with workers the block data lives in shared memory and is simulated off-process
+        self.shards: Optional[ShardPool] = None
+        if workers > 0:
+            self.shards = ShardPool(xr * yr, workers, seed, observers=self.observers)
+
         for j in range(yr):
             for i in range(xr):
-                index = j * yr + i
+                index = j * xr + i
+
+                if self.shards is None:
+                    blocks = BlockStorage.from_keys(chunk_keys(seed, index))
+                else:
+                    blocks = SharedBlocks(self.shards, index)
 
                 self.chunks.append(Chunk(index, (
                     w2 + cx * (i - xr / 2),
                     h2 + cy * (j - yr / 2)
-                )))
+                ), blocks, self.observers))
 
         self.loading: List[Set[int]] = [
             set(),  # load vbos
@@ -208,10 +279,84 @@ class ChunkGrid:
         ]
 
         self.current: int = -1
+        # tiles uploaded per frame for the chunk being shown
+        self.budget = budget
 
     def __getitem__(self, item: Union[int, slice]) -> Chunk:
         return self.chunks[item]
 
+    def __iter__(self) -> Iterator[Chunk]:
+        return iter(self.chunks)
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    # ============================ geometry ============================
+    # Chunk (i, j) is named j * columns + i and covers the world blocks
+    # x in [16i, 16i + 16) and y in [16j, 16j + 16).
+
+    def coordinates(self, name: int) -> Tuple[int, int]:
+        return name % self.columns, name // self.columns
+
+    def neighbours(self, name: int) -> List[int]:
+        """Names of the chunks sharing an edge with a chunk."""
+        i, j = self.coordinates(name)
+        return [
+            (j + dj) * self.columns + (i + di)
+            for di, dj in ((1, 0), (-1, 0), (0, 1), (0, -1))
+            if 0 <= i + di < self.columns and 0 <= j + dj < self.rows
+        ]
+
+    def origin(self, name: int) -> Tuple[int, int]:
+        """World block coordinates of a chunk's first block."""
+        i, j = self.coordinates(name)
+        return i * CHUNK_WIDTH, j * CHUNK_WIDTH
+
+    def locate(self, cell: Tuple[int, int]) -> Optional[int]:
+        """Name of the chunk containing a world block, None outside the grid."""
+        i, j = cell[0] // CHUNK_WIDTH, cell[1] // CHUNK_WIDTH
+        if 0 <= i < self.columns and 0 <= j < self.rows:
+            return j * self.columns + i
+        return None
+
+    def border(self, a: int, b: int) -> Tuple[tuple, tuple, List[Tuple[int, int]], List[Tuple[int, int]]]:
+        """
+        Where neighbouring chunks a < b touch: indices selecting the touching
+        edge of each chunk's (y, x) block grid, and the world blocks along
+        both edges in the same order.
+        """
+        last = CHUNK_WIDTH - 1
+        ax, ay = self.origin(a)
+        bx, by = self.origin(b)
+        steps = range(CHUNK_WIDTH)
+
+        if self.coordinates(a)[1] == self.coordinates(b)[1]:
+            # b is east of a
+            return (
+                (slice(None), last), (slice(None), 0),
+                [(ax + last, ay + k) for k in steps], [(bx, by + k) for k in steps]
+            )
+        # b is north of a
+        return (
+            (last, slice(None)), (0, slice(None)),
+            [(ax + k, ay + last) for k in steps], [(bx + k, by) for k in steps]
+        )
+
+    def restore(self, name: int, offset: Tuple[float, float], blocks: BlockStorage):
+        """Replace a chunk's data with one loaded from a snapshot."""
+        if not 0 <= name < len(self.chunks):
+            raise IndexError(f"chunk {name} is outside the {self.columns}x{self.rows} grid")
+
+        chunk = self.chunks[name]
+        chunk.offset = offset
+        if isinstance(chunk.blocks, SharedBlocks):
+            chunk.blocks.load(blocks)
+        else:
+            chunk.blocks = blocks
+
+        for observer in self.observers:
+            observer(name, -1, -1, -1)
+
     def process_graphics(self, batch: Batch, view_box: Rectangle):
         visible, hidden, available, unavailable = self.loading
 
@@ -232,6 +377,11 @@ class ChunkGrid:
         showing = len(visible)
         hiding = len(hidden)
 
+        global_stats.gauge("chunks_showing", showing)
+        global_stats.gauge("chunks_hiding", hiding)
+        global_stats.gauge("chunks_loading", len(available))
+        global_stats.gauge("chunks_caching", len(unavailable))
+
         if showing and (hiding == 0 or random() > 0.5) and self.current < 0:
             index = visible.pop()
             chunk = self[index]
@@ -245,7 +395,7 @@ class ChunkGrid:
 
         if self.current > -1:
             chunk = self[self.current]
-            if chunk.process(batch):
+            if chunk.process(batch, self.budget):
                 self.current = -1
 
 
@@ -253,12 +403,16 @@ class Board:
     """Collection of chunks."""
     def __init__(
             self, batch: Batch, camera: Camera,
-            init_width: int, init_height: int
+            init_width: int, init_height: int,
+            workers: int = 0, seed: int = 0,
+            size: int = 5, budget: int = 4
     ):
         self.batch = batch
         self.camera = camera
 
-        self.chunks: ChunkGrid = ChunkGrid(init_width, init_height)
+        self.chunks: ChunkGrid = ChunkGrid(init_width, init_height, workers, seed, size, budget)
+        self.pathfinder = Pathfinder(self.chunks)
+        self.regions = RegionLabels(self.chunks)
 
     @global_timer.timed
     def update(self, dt):
@@ -266,4 +420,10 @@ class Board:
         # view_box = self.camera.rectangle.scale(-200., -200.)
         # view_box = self.camera.rectangle.scale(200., 200.)
         view_box = self.camera.rectangle
+        if self.chunks.shards is not None:
+            self.chunks.shards.tick(dt)
         self.chunks.process_graphics(self.batch, view_box)
+
+    def close(self):
+        if self.chunks.shards is not None:
+            self.chunks.shards.close()
@@ -9,13 +9,15 @@ class Camera:
     Extended from the pyglet example camera
     """
 
-    def __init__(self, scroll_speed=1, min_zoom=1, max_zoom=4):
+    def __init__(self, scroll_speed=1, min_zoom=1, max_zoom=4, width=800, height=640):
         assert min_zoom <= max_zoom, "Minimum zoom must not be greater than maximum zoom"
         self.scroll_speed = scroll_speed
         self.max_zoom = max_zoom
         self.min_zoom = min_zoom
         self.offset_x = 0
         self.offset_y = 0
+        self.width = width
+        self.height = height
         self._zoom = max(min(1, self.max_zoom), self.min_zoom)
 
     @property
@@ -70,4 +72,4 @@ class Camera:
 
     @property
     def rectangle(self) -> Rectangle:
-        return Rectangle(self.offset_x, self.offset_y, 800, 640)
+        return Rectangle(self.offset_x, self.offset_y, self.width, self.height)
@@ -0,0 +1,138 @@
+"""
+Command line entry point.
+
+    python cli.py --width 1280 --height 720 --seed 42
+    python cli.py --headless --benchmark 3600 --workers 8
+    python cli.py --replay session.rec --headless --frames after.json --profile
+    python cli.py --compare before.json after.json
+
+pyglet decides on headless rendering when its GL module is first
+imported, so the arguments are parsed before the simulation is.
+"""
+
+import argparse
+import sys
+from typing import List, Optional
+
+import pyglet
+
+
+def parse_arguments(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Infinite world miner simulation.")
+
+    window = parser.add_argument_group("window")
+    window.add_argument("--width", type=int, default=800, help="window width in pixels")
+    window.add_argument("--height", type=int, default=640, help="window height in pixels")
+    window.add_argument("--framerate", type=float, default=60., help="ticks per second")
+    window.add_argument(
+        "--headless", action="store_true",
+        help="render offscreen through EGL and tick as fast as possible"
+    )
+
+    world = parser.add_argument_group("world")
+    world.add_argument("--seed", type=int, help="world seed, random when omitted")
+    world.add_argument("--chunks", type=int, default=5, help="chunks along each side of the grid")
+    world.add_argument(
+        "--chunk-budget", type=int, default=4,
+        help="4x4 block tiles uploaded per frame for a chunk coming into view"
+    )
+    world.add_argument(
+        "--workers", type=int, default=0,
+        help="simulate the world in this many processes, 0 keeps it in-process"
+    )
+    world.add_argument("--save", metavar="FILE", help="world snapshot to load from and save to")
+    world.add_argument(
+        "--autosave", type=float, default=30., metavar="SECONDS",
+        help="interval between incremental snapshot saves"
+    )
+
+    runs = parser.add_argument_group("performance runs")
+    runs.add_argument("--record", metavar="FILE", help="record input to replay later")
+    runs.add_argument("--replay", metavar="FILE", help="replay recorded input and seed")
+    runs.add_argument(
+        "--benchmark", type=int, metavar="TICKS",
+        help="stop after this many ticks and print frame, timer and render statistics"
+    )
+    runs.add_argument(
+        "--profile", nargs="?", const="", metavar="FILE",
+        help="run under cProfile, writing the stats to FILE or printing them"
+    )
+    runs.add_argument("--frames", metavar="FILE", help="save frame times and timer report as JSON")
+    runs.add_argument("--stats", metavar="FILE", help="dump render statistics as CSV, or JSON by extension")
+    runs.add_argument(
+        "--compare", nargs=2, metavar=("BEFORE", "AFTER"),
+        help="compare two saved frame time files and exit"
+    )
+
+    arguments = parser.parse_args(argv)
+
+    if arguments.headless and arguments.replay is None and arguments.benchmark is None:
+        parser.error("--headless needs --replay or --benchmark to know when to stop")
+    if arguments.record is not None and arguments.replay is not None:
+        parser.error("--record and --replay can't be used together")
+    if arguments.save is not None and (arguments.record is not None or arguments.replay is not None):
+        # a recording only holds the seed, the world must be generated from it alone
+        parser.error("--save can't be used with --record or --replay")
+    if arguments.seed is not None and not 0 <= arguments.seed < 1 << 64:
+        # recordings store the seed as an unsigned 64 bit integer
+        parser.error("--seed must be between 0 and 2**64 - 1")
+    if arguments.headless and "pyglet.gl" in sys.modules:
+        parser.error("--headless must be set before pyglet.gl is imported, run cli.py directly")
+
+    return arguments
+
+
+def main(argv: Optional[List[str]] = None):
+    arguments = parse_arguments(argv)
+
+    if arguments.compare is not None:
+        from replay import compare
+
+        compare(*arguments.compare)
+        return
+
+    if arguments.headless:
+        pyglet.options['headless'] = True
+        pyglet.options['shadow_window'] = False
+
+    from Miners import Simulation
+    from common import global_timer, global_stats
+
+    simulation = Simulation(
+        arguments.width, arguments.height, arguments.framerate,
+        save_file=arguments.save, autosave=arguments.autosave,
+        seed=arguments.seed, headless=arguments.headless,
+        record_file=arguments.record, replay_file=arguments.replay,
+        frames_file=arguments.frames, stats_file=arguments.stats,
+        workers=arguments.workers, chunks=arguments.chunks,
+        chunk_budget=arguments.chunk_budget, ticks=arguments.benchmark,
+    )
+    print(f"seed: {simulation.seed}")
+
+    if arguments.profile is None:
+        simulation.run()
+    else:
+        import cProfile
+        import pstats
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        simulation.run()
+        profiler.disable()
+
+        if arguments.profile:
+            profiler.dump_stats(arguments.profile)
+        else:
+            pstats.Stats(profiler).sort_stats("cumulative").print_stats(30)
+
+    if arguments.benchmark is not None or arguments.profile is not None:
+        print("frames:")
+        simulation.frames.show()
+        print("timer:")
+        global_timer.show()
+        print("render:")
+        global_stats.show()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,21 @@
+import numpy as np
+
+from stats import RenderStats
 from timer import Timer
 
 global_timer = Timer()
+global_stats = RenderStats()
 GRID_SIZE = 32  # px
+CHUNK_WIDTH = 16  # blocks
+
+
+def block_index(x: int, y: int) -> int:
+    """Index of the block at (x, y) within a chunk. Blocks are stored in 4x4 tiles."""
+    return ((y >> 2) << 6) | ((x >> 2) << 4) | ((y & 3) << 2) | (x & 3)
+
+
+# BLOCK_LAYOUT[y, x] == block_index(x, y), so keys[BLOCK_LAYOUT] is a chunk as a (y, x) grid
+BLOCK_LAYOUT = np.array([
+    [block_index(x, y) for x in range(CHUNK_WIDTH)]
+    for y in range(CHUNK_WIDTH)
+])
@@ -0,0 +1,33 @@
+from random import Random
+
+import pyglet
+import pytest
+
+# boards are built offscreen, and pyglet decides that when pyglet.gl is first imported
+pyglet.options['headless'] = True
+pyglet.options['shadow_window'] = False
+
+
+@pytest.fixture
+def world():
+    """Build chunk grids of random blocks, closing their shard pools afterwards."""
+    from board import Block, ChunkGrid
+    from storage import BlockStorage
+
+    grids = []
+
+    def build(size: int = 5, broken: float = 0.6, values: int = 3, seed: int = 0, workers: int = 0):
+        grid = ChunkGrid(800, 640, workers=workers, size=size)
+        grids.append(grid)
+
+        rng = Random(seed)
+        for chunk in grid:
+            keys = [Block(rng.random() < broken, rng.randrange(values)).key for _ in range(256)]
+            grid.restore(chunk.name, chunk.offset, BlockStorage.from_keys(keys))
+        return grid
+
+    yield build
+
+    for grid in grids:
+        if grid.shards is not None:
+            grid.shards.close()
@@ -0,0 +1,287 @@
+"""
+Hierarchical pathfinding over the chunk grid.
+
+Every chunk caches a navigation abstraction: the open cells along its
+edges that lead into an open cell of the neighbouring chunk (portals,
+one per contiguous opening) and the walking distance between every pair
+of its portals. A query searches the small graph of portals with A* and
+then refines each abstract step into blocks with a local search inside
+a single chunk.
+
+Blocks are open once they have been broken. Cells are world block
+coordinates, laid out over the chunks by ChunkGrid. Movement is
+4-connected with unit cost.
+"""
+
+from collections import deque
+from heapq import heappush, heappop
+from itertools import count
+from typing import Dict, List, Optional, Tuple, Set, Iterable
+
+import numpy as np
+
+from common import BLOCK_LAYOUT, CHUNK_WIDTH
+
+
+Cell = Tuple[int, int]
+
+STEPS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+
+
+class ChunkNav:
+    """Cached navigation data for one chunk."""
+
+    __slots__ = ['open', 'portals', 'distances', 'paths', 'stale']
+
+    def __init__(self, open_cells: np.ndarray):
+        self.open = open_cells
+        self.portals: Set[Cell] = set()
+        self.distances: Optional[Dict[Cell, Dict[Cell, int]]] = None
+        self.paths: Dict[Tuple[Cell, Cell], List[Cell]] = {}
+        # set until the portals are known, and again when a neighbour changes
+        self.stale = True
+
+
+class Pathfinder:
+    def __init__(self, grid):
+        self.grid = grid
+        self.navs: Dict[int, ChunkNav] = {}
+        self.entrances: Dict[Tuple[int, int], List[Tuple[Cell, Cell]]] = {}
+
+        grid.observers.append(self.on_block)
+
+    # ========================== chunk cache ==========================
+    def on_block(self, name: int, index: int, old: int, new: int):
+        # only the broken bit changes walkability, index -1 replaces the whole chunk
+        if index < 0 or (old ^ new) & 1:
+            self.invalidate(name)
+
+    def invalidate(self, name: int):
+        """Drop the navigation cache of one chunk."""
+        self.navs.pop(name, None)
+
+        for neighbour in self.grid.neighbours(name):
+            self.entrances.pop((min(name, neighbour), max(name, neighbour)), None)
+            nav = self.navs.get(neighbour)
+            if nav is not None:
+                nav.stale = True
+
+    def is_open(self, cell: Cell) -> bool:
+        name = self.grid.locate(cell)
+        if name is None:
+            return False
+        ox, oy = self.grid.origin(name)
+        return bool(self.nav(name).open[cell[1] - oy, cell[0] - ox])
+
+    def nav(self, name: int) -> ChunkNav:
+        self.nav_open(name)
+        nav = self.navs[name]
+
+        if nav.stale:
+            nav.stale = False
+            portals = self.portals(name)
+            if nav.distances is None or portals != nav.portals:
+                nav.portals = portals
+                nav.paths.clear()
+                nav.distances = {
+                    portal: {
+                        other: distance for other, distance in self.search(name, portal).items()
+                        if other in portals and other != portal
+                    }
+                    for portal in portals
+                }
+
+        return nav
+
+    def edge(self, a: int, b: int) -> List[Tuple[Cell, Cell]]:
+        """Entrances between neighbouring chunks a < b, as (cell in a, cell in b) pairs."""
+        key = (a, b)
+        try:
+            return self.entrances[key]
+        except KeyError:
+            pass
+
+        edge_a, edge_b, cells_a, cells_b = self.grid.border(a, b)
+        opening = self.nav_open(a)[edge_a] & self.nav_open(b)[edge_b]
+
+        entrances = []
+        start = None
+        for k in range(CHUNK_WIDTH + 1):
+            if k < CHUNK_WIDTH and opening[k]:
+                if start is None:
+                    start = k
+            elif start is not None:
+                middle = (start + k - 1) // 2
+                entrances.append((cells_a[middle], cells_b[middle]))
+                start = None
+
+        self.entrances[key] = entrances
+        return entrances
+
+    def nav_open(self, name: int) -> np.ndarray:
+        """Walkable cells of a chunk as a (y, x) grid, without resolving its portals."""
+        nav = self.navs.get(name)
+        if nav is None:
+            keys = self.grid[name].blocks.keys()
+            nav = ChunkNav((np.asarray(keys)[BLOCK_LAYOUT] & 1).astype(bool))
+            self.navs[name] = nav
+        return nav.open
+
+    def portals(self, name: int) -> Set[Cell]:
+        portals = set()
+        for neighbour in self.grid.neighbours(name):
+            a, b = min(name, neighbour), max(name, neighbour)
+            for cell_a, cell_b in self.edge(a, b):
+                portals.add(cell_a if a == name else cell_b)
+        return portals
+
+    # ========================== local search ==========================
+    def search(self, name: int, source: Cell, parents: Optional[Dict[Cell, Cell]] = None) -> Dict[Cell, int]:
+        """Breadth first search confined to one chunk."""
+        open_cells = self.nav_open(name)
+        ox, oy = self.grid.origin(name)
+
+        distances = {source: 0}
+        frontier = deque([source])
+        while frontier:
+            cell = frontier.popleft()
+            x, y = cell
+            for dx, dy in STEPS:
+                nx, ny = x + dx, y + dy
+                lx, ly = nx - ox, ny - oy
+                if (
+                    0 <= lx < CHUNK_WIDTH and 0 <= ly < CHUNK_WIDTH
+                    and open_cells[ly, lx] and (nx, ny) not in distances
+                ):
+                    distances[nx, ny] = distances[cell] + 1
+                    if parents is not None:
+                        parents[nx, ny] = cell
+                    frontier.append((nx, ny))
+        return distances
+
+    def refine(self, name: int, source: Cell, target: Cell) -> List[Cell]:
+        """Blocks walked from source (exclusive) to target (inclusive) inside one chunk."""
+        nav = self.nav(name)
+        key = (source, target)
+        try:
+            return nav.paths[key]
+        except KeyError:
+            pass
+
+        parents: Dict[Cell, Cell] = {}
+        self.search(name, source, parents)
+        path = []
+        cell = target
+        while cell != source:
+            path.append(cell)
+            cell = parents[cell]
+        path.reverse()
+
+        # only portal to portal paths are reused between queries
+        if source in nav.portals and target in nav.portals:
+            nav.paths[key] = path
+        return path
+
+    # ========================= abstract search =========================
+    def connect(self, cell: Cell) -> Dict[Cell, int]:
+        """Distances from an arbitrary open cell to the portals of its chunk."""
+        name = self.grid.locate(cell)
+        portals = self.nav(name).portals
+        return {
+            portal: distance for portal, distance in self.search(name, cell).items()
+            if portal in portals
+        }
+
+    def find_path(self, start: Cell, goal: Cell) -> Optional[List[Cell]]:
+        """Blocks walked from start (exclusive) to goal (inclusive), None if unreachable."""
+        return self.find_paths([(start, goal)])[0]
+
+    def find_paths(self, queries: Iterable[Tuple[Cell, Cell]]) -> List[Optional[List[Cell]]]:
+        """
+        Answer many queries at once. Queries sharing a start or goal
+        reuse the search connecting it to the portal graph.
+        """
+        links: Dict[Cell, Dict[Cell, int]] = {}
+        results = []
+        for start, goal in queries:
+            if not (self.is_open(start) and self.is_open(goal)):
+                results.append(None)
+                continue
+            if start == goal:
+                results.append([])
+                continue
+
+            for cell in (start, goal):
+                if cell not in links:
+                    links[cell] = self.connect(cell)
+
+            results.append(self._find(start, goal, links[start], links[goal]))
+        return results
+
+    def _find(
+            self, start: Cell, goal: Cell,
+            start_links: Dict[Cell, int], goal_links: Dict[Cell, int]
+    ) -> Optional[List[Cell]]:
+        start_chunk = self.grid.locate(start)
+        goal_chunk = self.grid.locate(goal)
+        gx, gy = goal
+
+        def edges(node: Cell):
+            if node == start:
+                yield from start_links.items()
+                if start_chunk == goal_chunk:
+                    distance = self.search(start_chunk, start).get(goal)
+                    if distance is not None:
+                        yield goal, distance
+                if start not in self.nav(start_chunk).portals:
+                    return
+
+            name = self.grid.locate(node)
+            yield from self.nav(name).distances[node].items()
+            if node in goal_links and name == goal_chunk:
+                yield goal, goal_links[node]
+
+            x, y = node
+            for dx, dy in STEPS:
+                other = (x + dx, y + dy)
+                other_chunk = self.grid.locate(other)
+                if (
+                    other_chunk is not None and other_chunk != name
+                    and other in self.nav(other_chunk).portals
+                ):
+                    yield other, 1
+
+        tiebreak = count()
+        best = {start: 0}
+        parents: Dict[Cell, Cell] = {}
+        frontier = [(abs(start[0] - gx) + abs(start[1] - gy), 0, next(tiebreak), start)]
+        while frontier:
+            _, cost, _, node = heappop(frontier)
+            if node == goal:
+                break
+            if cost > best[node]:
+                continue
+
+            for other, distance in edges(node):
+                new_cost = cost + distance
+                if new_cost < best.get(other, new_cost + 1):
+                    best[other] = new_cost
+                    parents[other] = node
+                    estimate = new_cost + abs(other[0] - gx) + abs(other[1] - gy)
+                    heappush(frontier, (estimate, new_cost, next(tiebreak), other))
+        else:
+            return None
+
+        nodes = [goal]
+        while nodes[-1] != start:
+            nodes.append(parents[nodes[-1]])
+        nodes.reverse()
+
+        path = []
+        for source, target in zip(nodes, nodes[1:]):
+            source_chunk = self.grid.locate(source)
+            if source_chunk == self.grid.locate(target):
+                path.extend(self.refine(source_chunk, source, target))
+            else:
+                path.append(target)
+        return path
@@ -0,0 +1,216 @@
+"""
+Connected regions of blocks.
+
+Blocks belong to the same region when they are 4-connected and of the
+same class: intact blocks by their value (ore veins), broken blocks all
+together (caverns). Each chunk is labeled on its own with vectorized
+label propagation, and the per-chunk components are kept as the nodes of
+a graph whose edges join touching components across chunk borders;
+regions are its connected parts. A changed block relabels only its own
+chunk, restitches the borders it shares, and regroups only the regions
+that lost or gained a component, so the work follows the size of those
+regions rather than of the world.
+
+Cells are world block coordinates, laid out over the chunks by ChunkGrid.
+"""
+
+from typing import Dict, List, Tuple, Set
+
+import numpy as np
+
+from common import BLOCK_LAYOUT, CHUNK_WIDTH
+
+
+Cell = Tuple[int, int]
+
+OPEN = -1  # class of broken blocks
+
+
+def label(classes: np.ndarray) -> np.ndarray:
+    """Label the 4-connected components of equal classes in a 2D grid, each by its smallest flat index."""
+    height, width = classes.shape
+    labels = np.arange(height * width).reshape(height, width)
+
+    same_x = classes[:, 1:] == classes[:, :-1]
+    same_y = classes[1:, :] == classes[:-1, :]
+
+    while True:
+        previous = labels
+        labels = labels.copy()
+
+        # take the smaller label of every same-class neighbour
+        np.minimum(labels[:, 1:], np.where(same_x, labels[:, :-1], labels[:, 1:]), out=labels[:, 1:])
+        np.minimum(labels[:, :-1], np.where(same_x, labels[:, 1:], labels[:, :-1]), out=labels[:, :-1])
+        np.minimum(labels[1:, :], np.where(same_y, labels[:-1, :], labels[1:, :]), out=labels[1:, :])
+        np.minimum(labels[:-1, :], np.where(same_y, labels[1:, :], labels[:-1, :]), out=labels[:-1, :])
+
+        # labels are cells of the same component, so jumping through them stays inside it
+        labels = labels.reshape(-1)[labels]
+
+        if np.array_equal(labels, previous):
+            return labels
+
+
+class ChunkRegions:
+    """Components of one chunk, numbered from zero."""
+
+    __slots__ = ['labels', 'classes', 'sizes']
+
+    def __init__(self, keys: np.ndarray):
+        # shared blocks are unsigned, and OPEN has to stay negative
+        grid = np.asarray(keys, dtype=np.int64)[BLOCK_LAYOUT]
+        cell_classes = np.where(grid & 1, OPEN, grid >> 1)
+
+        roots, local = np.unique(label(cell_classes), return_inverse=True)
+        self.labels: np.ndarray = local.reshape(grid.shape)
+        self.classes: np.ndarray = cell_classes.reshape(-1)[roots]
+        self.sizes: np.ndarray = np.bincount(local.reshape(-1))
+
+
+class RegionLabels:
+    def __init__(self, grid):
+        self.grid = grid
+        self.chunks: Dict[int, ChunkRegions] = {}
+
+        # every chunk component is a node of a graph joined across chunk borders
+        self.nodes: Dict[int, List[int]] = {}
+        self.owners: Dict[int, Tuple[int, int]] = {}
+        self.adjacent: Dict[int, Set[int]] = {}
+        self._next_node = 0
+
+        # regions are the connected parts of that graph
+        self.regions: Dict[int, int] = {}
+        self.members: Dict[int, Set[int]] = {}
+        self.sizes: Dict[int, int] = {}
+        self._next_region = 0
+
+        self.dirty: Set[int] = set(range(len(grid)))
+        grid.observers.append(self.on_block)
+
+    def on_block(self, name: int, index: int, old: int, new: int):
+        self.dirty.add(name)
+
+    # ============================ updating ============================
+    def refresh(self):
+        if not self.dirty:
+            return
+        dirty, self.dirty = self.dirty, set()
+
+        # nodes whose region has to be found again
+        affected: Set[int] = set()
+
+        for name in dirty:
+            for node in self.nodes.pop(name, ()):
+                affected |= self.dissolve(node)
+                for other in self.adjacent.pop(node):
+                    self.adjacent[other].discard(node)
+                del self.owners[node]
+
+            regions = ChunkRegions(self.grid[name].blocks.keys())
+            self.chunks[name] = regions
+
+            nodes = list(range(self._next_node, self._next_node + len(regions.sizes)))
+            self._next_node += len(nodes)
+            self.nodes[name] = nodes
+            for local, node in enumerate(nodes):
+                self.owners[node] = (name, local)
+                self.adjacent[node] = set()
+            affected.update(nodes)
+
+        for name in dirty:
+            for neighbour in self.grid.neighbours(name):
+                if neighbour in dirty and neighbour < name:
+                    # already stitched from the other side
+                    continue
+
+                a, b = min(name, neighbour), max(name, neighbour)
+                nodes_a, nodes_b = self.nodes[a], self.nodes[b]
+                for local_a, local_b in self.stitch(a, b).tolist():
+                    node_a, node_b = nodes_a[local_a], nodes_b[local_b]
+                    self.adjacent[node_a].add(node_b)
+                    self.adjacent[node_b].add(node_a)
+                    # a new edge may merge the neighbour's region with ours
+                    affected |= self.dissolve(node_b if a == name else node_a)
+
+        # edges only join components of one region, so flooding from the
+        # affected nodes never reaches a region that is still intact
+        affected &= self.owners.keys()
+        while affected:
+            seed = affected.pop()
+            members = {seed}
+            frontier = [seed]
+            while frontier:
+                for other in self.adjacent[frontier.pop()]:
+                    if other not in members:
+                        members.add(other)
+                        frontier.append(other)
+            affected -= members
+
+            region = self._next_region
+            self._next_region += 1
+            size = 0
+            for node in members:
+                self.regions[node] = region
+                name, local = self.owners[node]
+                size += int(self.chunks[name].sizes[local])
+            self.members[region] = members
+            self.sizes[region] = size
+
+    def dissolve(self, node: int) -> Set[int]:
+        """Forget the region containing a node, returning its members."""
+        region = self.regions.pop(node, None)
+        if region is None:
+            return set()
+
+        members = self.members.pop(region)
+        del self.sizes[region]
+        for member in members:
+            self.regions.pop(member, None)
+        return members
+
+    def stitch(self, a: int, b: int) -> np.ndarray:
+        """Pairs of touching components (in a, in b) of equal class across the border of a < b."""
+        regions_a, regions_b = self.chunks[a], self.chunks[b]
+        index_a, index_b, _, _ = self.grid.border(a, b)
+        edge_a, edge_b = regions_a.labels[index_a], regions_b.labels[index_b]
+
+        touching = regions_a.classes[edge_a] == regions_b.classes[edge_b]
+        pairs = np.stack([edge_a[touching], edge_b[touching]], axis=1)
+        return np.unique(pairs, axis=0)
+
+    # ============================ querying ============================
+    def component(self, cell: Cell) -> Tuple[int, int, int]:
+        """Graph node of a cell's component, with the chunk and local component it stands for."""
+        name = self.grid.locate(cell)
+        if name is None:
+            raise IndexError(f"cell {cell} is outside the world")
+
+        self.refresh()
+        local = int(self.chunks[name].labels[cell[1] % CHUNK_WIDTH, cell[0] % CHUNK_WIDTH])
+        return self.nodes[name][local], name, local
+
+    def region(self, cell: Cell) -> int:
+        """
+        Id of the region containing a cell. Any block change in a chunk the
+        region touches, or in a chunk next to one, may renumber it.
+        """
+        node, _, _ = self.component(cell)
+        return self.regions[node]
+
+    def region_size(self, cell: Cell) -> int:
+        return self.sizes[self.region(cell)]
+
+    def region_class(self, cell: Cell) -> int:
+        """Value of the blocks in the region containing a cell, OPEN for caverns."""
+        _, name, local = self.component(cell)
+        return int(self.chunks[name].classes[local])
+
+    def cells(self, cell: Cell) -> List[Cell]:
+        """Every cell in the region containing a cell."""
+        cells = []
+        for node in self.members[self.region(cell)]:
+            name, local = self.owners[node]
+            ox, oy = self.grid.origin(name)
+            ys, xs = np.nonzero(self.chunks[name].labels == local)
+            cells.extend(zip((xs + ox).tolist(), (ys + oy).tolist()))
+        return cells
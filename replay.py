@@ -0,0 +1,144 @@
+"""
+Recorded input for deterministic runs.
+
+An input file holds the world seed and, for every tick, the camera
+movement and the tick's dt. Replaying it feeds the simulation exactly
+the same ticks, so frame timings of two builds can be compared.
+
+    header:  b"MNRI" version:u16 seed:u64 framerate:f32
+    tick:    movement:u8 dt:f32     movement = (dx + 1) | (dy + 1) << 2
+"""
+
+import json
+from struct import Struct
+from time import perf_counter
+from typing import List, Tuple, Optional
+
+from common import global_timer
+
+
+MAGIC = b"MNRI"
+VERSION = 1
+
+HEADER = Struct('<4sHQf')
+TICK = Struct('<Bf')
+
+
+class InputRecorder:
+    def __init__(self, path: str, seed: int, framerate: float, buffered: int = 600):
+        self.path = path
+        self.buffered = buffered
+        self._buffer = bytearray(HEADER.pack(MAGIC, VERSION, seed, framerate))
+        self._ticks = 0
+
+        # truncate now so a crashed session doesn't leave an older recording behind
+        with open(self.path, 'wb'):
+            pass
+
+    def record(self, dx: int, dy: int, dt: float):
+        self._buffer += TICK.pack((dx + 1) | (dy + 1) << 2, dt)
+        self._ticks += 1
+        if self._ticks % self.buffered == 0:
+            self.flush()
+
+    def flush(self):
+        with open(self.path, 'ab') as file:
+            file.write(self._buffer)
+        self._buffer.clear()
+
+    def close(self):
+        self.flush()
+
+
+class InputPlayer:
+    def __init__(self, path: str):
+        with open(path, 'rb') as file:
+            buffer = file.read()
+
+        magic, version, self.seed, self.framerate = HEADER.unpack_from(buffer)
+        if magic != MAGIC:
+            raise ValueError(f"'{path}' is not an input recording")
+        if version != VERSION:
+            raise ValueError(f"unsupported input recording version {version} in '{path}'")
+
+        self.ticks: List[Tuple[int, int, float]] = [
+            ((movement & 3) - 1, (movement >> 2 & 3) - 1, dt)
+            for movement, dt in TICK.iter_unpack(buffer[HEADER.size:])
+        ]
+        self.position = 0
+
+    def __len__(self):
+        return len(self.ticks)
+
+    @property
+    def finished(self) -> bool:
+        return self.position >= len(self.ticks)
+
+    def next(self) -> Tuple[int, int, float]:
+        if self.finished:
+            raise StopIteration
+        tick = self.ticks[self.position]
+        self.position += 1
+        return tick
+
+
+class FrameLog:
+    """Wall time spent on every frame, saved with the global timer's report."""
+
+    def __init__(self):
+        self.frames: List[float] = []
+        self._start: Optional[float] = None
+
+    def begin(self):
+        self._start = perf_counter()
+
+    def end(self):
+        if self._start is not None:
+            self.frames.append(perf_counter() - self._start)
+            self._start = None
+
+    def percentiles(self) -> dict:
+        frames = sorted(self.frames)
+        if not frames:
+            return {}
+
+        def at(fraction: float) -> float:
+            return frames[min(len(frames) - 1, int(fraction * len(frames)))]
+
+        return {
+            "frames": len(frames),
+            "mean": sum(frames) / len(frames),
+            "p50": at(.5), "p90": at(.9), "p99": at(.99),
+            "max": frames[-1],
+        }
+
+    def save(self, path: str):
+        with open(path, 'w') as file:
+            json.dump({
+                "summary": self.percentiles(),
+                "frames": self.frames,
+                "timer": {
+                    name: {"mean": mean_s, "min": min_s, "max": max_s}
+                    for name, (mean_s, min_s, max_s) in global_timer.calculate().items()
+                },
+            }, file)
+
+    def show(self):
+        for name, value in self.percentiles().items():
+            if name == "frames":
+                print(f"    frames: {value:d}")
+            else:
+                print(f"    {name}: {value:.7f}")
+
+
+def compare(before_path: str, after_path: str):
+    """Print the frame time distributions of two saved frame logs side by side."""
+    with open(before_path) as file:
+        before = json.load(file)["summary"]
+    with open(after_path) as file:
+        after = json.load(file)["summary"]
+
+    for name in ("mean", "p50", "p90", "p99", "max"):
+        old, new = before[name], after[name]
+        change = (new - old) / old * 100 if old else 0.
+        print(f"    {name}: {old:.7f} -> {new:.7f} ({change:+.1f}%)")
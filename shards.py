@@ -0,0 +1,301 @@
+"""
+Multi-process world simulation.
+
+The chunks' block keys live in one shared memory buffer. The chunks are
+split into contiguous regions and every region is stepped by its own
+worker process, so the simulation isn't bound by the GIL. Workers only
+write blocks in their own region; a write that lands in another region
+is returned as a border message and delivered to the owning worker at
+the start of the next tick. The render process reads the same buffer
+through numpy views without copying.
+"""
+
+import multiprocessing as mp
+from multiprocessing.shared_memory import SharedMemory
+from queue import Empty
+from random import Random
+from traceback import format_exc
+from typing import List, Tuple, Callable, Dict, Optional
+
+import numpy as np
+
+from storage import BlockStorage
+
+
+CHUNK_SIZE = 256
+
+# (chunk name, block index, block key)
+Message = Tuple[int, int, int]
+# step(blocks, dirty, region, tick, dt) -> outgoing messages
+StepFunction = Callable[[np.ndarray, np.ndarray, range, int, float], List[Message]]
+# observer(chunk name, block index, old key, new key), as for ChunkGrid
+Observer = Callable[[int, int, int, int], None]
+
+
+def attach(name: str) -> SharedMemory:
+    try:
+        return SharedMemory(name, track=False)
+    except TypeError:
+        # before 3.13 attaching registers the buffer again, which is harmless
+        # because workers share the resource tracker of the process that created it
+        return SharedMemory(name)
+
+
+def views(memory: SharedMemory, chunks: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Block keys, the modified flags cleared by snapshots, and the flags of
+    chunks written by workers since the main process last looked.
+    """
+    blocks = np.ndarray((chunks, CHUNK_SIZE), dtype=np.uint32, buffer=memory.buf)
+    dirty = np.ndarray(
+        (chunks,), dtype=np.uint8, buffer=memory.buf, offset=blocks.nbytes
+    )
+    changed = np.ndarray(
+        (chunks,), dtype=np.uint8, buffer=memory.buf, offset=blocks.nbytes + chunks
+    )
+    return blocks, dirty, changed
+
+
+def chunk_keys(seed: int, name: int) -> List[int]:
+    """
+    Initial block keys of a chunk, drawn from its own stream so a world
+    is the same whichever process generates each chunk.
+    """
+    rng = Random(seed * 1000003 + name)
+    # intact blocks of a random value, keys are Block(value=...).key
+    return [rng.randrange(3) << 1 for _ in range(CHUNK_SIZE)]
+
+
+def generate(blocks: np.ndarray, region: range, seed: int):
+    for name in region:
+        blocks[name] = chunk_keys(seed, name)
+
+
+def idle(blocks: np.ndarray, dirty: np.ndarray, region: range, tick: int, dt: float) -> List[Message]:
+    """Default step function; the world has no rules of its own yet."""
+    return []
+
+
+def worker(
+        memory_name: str, chunks: int, region: range,
+        inbox: "mp.Queue", outbox: "mp.Queue", step: StepFunction
+):
+    memory = attach(memory_name)
+    blocks, dirty, changed = views(memory, chunks)
+
+    try:
+        while True:
+            command = inbox.get()
+            if command is None:
+                break
+
+            kind, *args = command
+            try:
+                if kind == "generate":
+                    seed, = args
+                    generate(blocks, region, seed)
+                    outbox.put((region.start, [], None))
+                elif kind == "tick":
+                    tick, dt, messages = args
+                    for name, index, key in messages:
+                        blocks[name, index] = key
+                        dirty[name] = changed[name] = 1
+
+                    outgoing = []
+                    for message in step(blocks, dirty, region, tick, dt):
+                        name, index, key = message
+                        if name in region:
+                            blocks[name, index] = key
+                            dirty[name] = changed[name] = 1
+                        else:
+                            outgoing.append(message)
+                    outbox.put((region.start, outgoing, None))
+            except Exception:
+                # the main process is waiting on our reply, so the error is the reply
+                outbox.put((region.start, None, format_exc()))
+                break
+    finally:
+        del blocks, dirty, changed
+        memory.close()
+
+
+class ShardPool:
+    """Owns the shared block buffer and the worker processes stepping it."""
+
+    def __init__(
+            self, chunks: int, workers: int, seed: int = 0,
+            step: StepFunction = idle, poll: float = 0.5,
+            observers: Optional[List[Observer]] = None
+    ):
+        assert workers > 0, "a shard pool needs at least one worker"
+        self.chunks = chunks
+        self.tick_count = 0
+        # seconds between checks that the workers are still alive while waiting on them
+        self.poll = poll
+        # told about every chunk a worker wrote, once its tick is collected
+        self.observers: List[Observer] = [] if observers is None else observers
+
+        nbytes = chunks * CHUNK_SIZE * 4 + chunks * 2
+        self.memory = SharedMemory(create=True, size=nbytes)
+        self.blocks, self.dirty, self.changed = views(self.memory, chunks)
+        self.dirty[:] = 0
+        self.changed[:] = 0
+
+        workers = min(workers, chunks)
+        bounds = np.linspace(0, chunks, workers + 1).astype(int)
+        self.regions: List[range] = [
+            range(start, stop) for start, stop in zip(bounds[:-1], bounds[1:])
+        ]
+        self.pending: Dict[int, List[Message]] = {region.start: [] for region in self.regions}
+
+        context = mp.get_context("spawn")
+        self.outbox = context.Queue()
+        self.inboxes = []
+        self.processes = []
+        for region in self.regions:
+            inbox = context.Queue()
+            process = context.Process(
+                target=worker, name=f"shard-{region.start}-{region.stop}",
+                args=(self.memory.name, chunks, region, inbox, self.outbox, step),
+                daemon=True,
+            )
+            process.start()
+            self.inboxes.append(inbox)
+            self.processes.append(process)
+
+        for inbox in self.inboxes:
+            inbox.put(("generate", seed))
+        self._running = len(self.inboxes)
+        self.collect()
+
+    def owner(self, name: int) -> range:
+        for region in self.regions:
+            if name in region:
+                return region
+        raise IndexError(f"chunk {name} is not in any shard")
+
+    def submit(self, dt: float):
+        """Start the next tick on every worker, handing over their border messages."""
+        if self._running:
+            self.collect()
+
+        for region, inbox in zip(self.regions, self.inboxes):
+            messages = self.pending[region.start]
+            self.pending[region.start] = []
+            inbox.put(("tick", self.tick_count, dt, messages))
+
+        self._running = len(self.inboxes)
+        self.tick_count += 1
+
+    def collect(self):
+        """
+        Wait for the running tick and route the messages crossing shard
+        borders. Raises RuntimeError if a worker failed or died.
+        """
+        while self._running:
+            try:
+                start, outgoing, error = self.outbox.get(timeout=self.poll)
+            except Empty:
+                for process in self.processes:
+                    if not process.is_alive():
+                        raise RuntimeError(
+                            f"shard worker {process.name} exited with code {process.exitcode}"
+                        )
+                continue
+
+            if error is not None:
+                raise RuntimeError(f"shard worker for chunks from {start} failed:\n{error}")
+
+            for message in outgoing:
+                self.pending[self.owner(message[0]).start].append(message)
+            self._running -= 1
+
+        # the workers are idle now, so the flags can't change under us
+        changed = np.flatnonzero(self.changed)
+        if len(changed):
+            self.changed[changed] = 0
+            for name in changed.tolist():
+                for observer in self.observers:
+                    observer(name, -1, -1, -1)
+
+    def tick(self, dt: float):
+        # the tick is only collected at the start of the next one, so workers run while we render
+        self.submit(dt)
+
+    def close(self):
+        if self.memory is None:
+            return
+
+        try:
+            self.collect()
+        except RuntimeError:
+            # a failed worker has already been reported, the rest still need stopping
+            self._running = 0
+
+        for inbox in self.inboxes:
+            inbox.put(None)
+        for process in self.processes:
+            process.join(self.poll * 4)
+            if process.is_alive():
+                process.terminate()
+
+        del self.blocks, self.dirty, self.changed
+        self.memory.close()
+        self.memory.unlink()
+        self.memory = None
+
+
+class SharedBlocks:
+    """
+    BlockStorage-compatible accessor for one chunk's blocks in a ShardPool.
+
+    Reads are zero-copy views of the shared buffer. Writes, and anything
+    reading or clearing the modified flag, first wait for the running tick
+    so they never race the workers; the owning worker sees a write on its
+    next tick.
+    """
+
+    __slots__ = ['pool', 'name']
+
+    def __init__(self, pool: ShardPool, name: int):
+        self.pool = pool
+        self.name = name
+
+    def __len__(self):
+        return CHUNK_SIZE
+
+    def __getitem__(self, index: int) -> int:
+        return int(self.pool.blocks[self.name, index])
+
+    def __setitem__(self, index: int, key: int):
+        self.pool.collect()
+        self.pool.blocks[self.name, index] = key
+        self.pool.dirty[self.name] = 1
+
+    @property
+    def modified(self) -> bool:
+        self.pool.collect()
+        return bool(self.pool.dirty[self.name])
+
+    @modified.setter
+    def modified(self, value: bool):
+        self.pool.collect()
+        self.pool.dirty[self.name] = value
+
+    @property
+    def nbytes(self) -> int:
+        return CHUNK_SIZE * 4
+
+    def keys(self) -> np.ndarray:
+        return self.pool.blocks[self.name]
+
+    def compact(self):
+        pass
+
+    def to_bytes(self) -> bytes:
+        self.pool.collect()
+        return BlockStorage.from_keys(self.keys()).to_bytes()
+
+    def load(self, storage: BlockStorage):
+        self.pool.collect()
+        self.pool.blocks[self.name] = storage.keys()
@@ -0,0 +1,228 @@
+"""
+Binary world snapshots.
+
+A snapshot file is a header followed by segments. Each segment is a
+sequence of tagged records closed by an END record, and is either a
+full save of the world or a delta holding only the chunks modified since
+the previous segment. Loading replays every complete segment in order,
+so later chunk records replace earlier ones. A segment cut short by a
+crash is ignored and trimmed off the file so later deltas follow the
+last complete one. The header records the shape of the chunk grid, and a
+snapshot only loads into a grid of the same shape.
+
+    header:  b"MNRS" version:u16 columns:u32 rows:u32
+    record:  tag:u8 length:u32 payload
+"""
+
+import os
+from queue import Queue
+from struct import Struct
+from threading import Thread
+from typing import Optional, Set, Tuple, List
+
+from storage import BlockStorage
+
+
+MAGIC = b"MNRS"
+VERSION = 2
+
+FILE_HEADER = Struct('<4sH')
+GRID_DATA = Struct('<II')      # columns, rows
+RECORD = Struct('<BI')
+
+SEGMENT = 0
+CAMERA = 1
+CHUNK = 2
+END = 255
+
+SEGMENT_DATA = Struct('<IB')   # sequence, full
+CAMERA_DATA = Struct('<ddd')   # offset x, offset y, zoom
+CHUNK_DATA = Struct('<Idd')    # name, offset x, offset y
+
+
+def record(tag: int, payload: bytes = b"") -> bytes:
+    return RECORD.pack(tag, len(payload)) + payload
+
+
+class Snapshotter:
+    """
+    Saves and restores a Board to a snapshot file.
+
+    Records are encoded on the calling thread, which only touches the
+    chunks that changed, and written to disk by a background thread so
+    autosaves don't stall the frame.
+    """
+
+    def __init__(self, path: str, autosave: Optional[float] = None, compact_after: int = 64):
+        self.path = path
+        self.autosave = autosave
+        self.compact_after = compact_after
+
+        self.sequence = 0
+        self.deltas = 0
+        self.elapsed = 0.
+
+        # chunks present in the file, anything else must be written in the next delta
+        self.saved: Set[int] = set()
+
+        self._queue: "Queue[Optional[Tuple[bool, bytes]]]" = Queue()
+        # set by the writer when a save fails, raised on the next save or flush
+        self._error: Optional[Exception] = None
+        self._writer = Thread(target=self._write, name="snapshot-writer", daemon=True)
+        self._writer.start()
+
+    # ============================ saving ============================
+    def save(self, board, full: bool = False):
+        self._check()
+        full = full or not self.saved or self.deltas >= self.compact_after
+
+        records: List[bytes] = [record(SEGMENT, SEGMENT_DATA.pack(self.sequence, full))]
+
+        camera = board.camera
+        records.append(record(CAMERA, CAMERA_DATA.pack(
+            camera.offset_x, camera.offset_y, camera.zoom
+        )))
+
+        for chunk in board.chunks:
+            if full or chunk.blocks.modified or chunk.name not in self.saved:
+                ox, oy = chunk.offset
+                records.append(record(
+                    CHUNK, CHUNK_DATA.pack(chunk.name, ox, oy) + chunk.blocks.to_bytes()
+                ))
+                chunk.blocks.modified = False
+                self.saved.add(chunk.name)
+
+        records.append(record(END))
+        if full:
+            grid = board.chunks
+            records.insert(0, FILE_HEADER.pack(MAGIC, VERSION) + GRID_DATA.pack(grid.columns, grid.rows))
+
+        self.sequence += 1
+        self.deltas = 0 if full else self.deltas + 1
+        self._queue.put((full, b"".join(records)))
+
+    def update(self, board, dt: float):
+        if self.autosave is None:
+            return
+
+        self.elapsed += dt
+        if self.elapsed >= self.autosave:
+            self.elapsed = 0.
+            self.save(board)
+
+    def flush(self):
+        """Block until every queued save has been written."""
+        self._queue.join()
+        self._check()
+
+    def _check(self):
+        error = self._error
+        if error is not None:
+            self._error = None
+            # the file is missing whatever failed, so start over from a full save
+            self.saved.clear()
+            raise error
+
+    def close(self):
+        """Stop the writer once every queued save is written, raising the last write error."""
+        self._queue.put(None)
+        self._writer.join()
+        self._check()
+
+    def _write(self):
+        # after a failure deltas would be appended to an incomplete file, so wait for a full save
+        failed = False
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+
+                full, segment = item
+                if failed and not full:
+                    continue
+
+                if full:
+                    # write beside the old file and swap so a crash never loses the last save
+                    temporary = self.path + ".tmp"
+                    with open(temporary, 'wb') as file:
+                        file.write(segment)
+                    os.replace(temporary, self.path)
+                else:
+                    with open(self.path, 'ab') as file:
+                        file.write(segment)
+                failed = False
+            except Exception as error:
+                failed = True
+                self._error = error
+            finally:
+                self._queue.task_done()
+
+    # ============================ loading ============================
+    def load(self, board) -> bool:
+        """Restore the board from the snapshot file, returning False if there is none."""
+        try:
+            with open(self.path, 'rb') as file:
+                buffer = file.read()
+        except FileNotFoundError:
+            return False
+
+        magic, version = FILE_HEADER.unpack_from(buffer)
+        if magic != MAGIC:
+            raise ValueError(f"'{self.path}' is not a world snapshot")
+        if version != VERSION:
+            raise ValueError(f"unsupported snapshot version {version} in '{self.path}'")
+
+        columns, rows = GRID_DATA.unpack_from(buffer, FILE_HEADER.size)
+        grid = board.chunks
+        if (columns, rows) != (grid.columns, grid.rows):
+            raise ValueError(
+                f"'{self.path}' holds a {columns}x{rows} chunk grid, "
+                f"the board has {grid.columns}x{grid.rows}"
+            )
+
+        camera = None
+        chunks = {}
+
+        segment_camera = None
+        segment_chunks = {}
+        offset = complete = FILE_HEADER.size + GRID_DATA.size
+        while offset + RECORD.size <= len(buffer):
+            tag, length = RECORD.unpack_from(buffer, offset)
+            offset += RECORD.size
+            payload = buffer[offset:offset + length]
+            offset += length
+            if len(payload) < length:
+                break
+
+            if tag == SEGMENT:
+                self.sequence, _ = SEGMENT_DATA.unpack_from(payload)
+                segment_camera = None
+                segment_chunks = {}
+            elif tag == CAMERA:
+                segment_camera = CAMERA_DATA.unpack_from(payload)
+            elif tag == CHUNK:
+                name, ox, oy = CHUNK_DATA.unpack_from(payload)
+                segment_chunks[name] = ((ox, oy), payload[CHUNK_DATA.size:])
+            elif tag == END:
+                if segment_camera is not None:
+                    camera = segment_camera
+                chunks.update(segment_chunks)
+                self.deltas += 1
+                complete = offset
+
+        if complete < len(buffer):
+            # drop the segment a crash cut short, or the next delta would be appended inside it
+            with open(self.path, 'r+b') as file:
+                file.truncate(complete)
+
+        for name, (chunk_offset, data) in sorted(chunks.items()):
+            board.chunks.restore(name, chunk_offset, BlockStorage.from_bytes(data))
+        if camera is not None:
+            x, y, zoom = camera
+            board.camera.position = x, y
+            board.camera.zoom = zoom
+
+        self.sequence += 1
+        self.saved = set(chunks)
+        return True
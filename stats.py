@@ -0,0 +1,99 @@
+import csv
+import json
+from collections import deque
+from typing import Dict, Deque, List, Tuple
+
+
+class RenderStats:
+    """
+    Per-frame counters of the work submitted for rendering.
+
+    Counters accumulate within a frame and gauges hold the last value set
+    in it. end_frame rolls the frame into the history and starts the next.
+    """
+
+    COUNTERS = (
+        "vertex_lists_created", "vertex_lists_deleted",
+        "vertices_uploaded", "bytes_uploaded", "draw_calls",
+    )
+    GAUGES = (
+        "chunks_showing", "chunks_hiding", "chunks_loading", "chunks_caching",
+    )
+
+    def __init__(self, history: int = 600):
+        self.frame: Dict[str, int] = dict.fromkeys(self.COUNTERS + self.GAUGES, 0)
+        self.frames: Deque[Dict[str, int]] = deque(maxlen=history)
+        self.totals: Dict[str, int] = dict.fromkeys(self.COUNTERS, 0)
+        self.frame_count = 0
+
+    def count(self, name: str, amount: int = 1):
+        self.frame[name] += amount
+
+    def gauge(self, name: str, value: int):
+        self.frame[name] = value
+
+    def uploaded(self, vertices: int, vertex_size: int):
+        """Record one vertex list of the given size (in bytes per vertex) created."""
+        frame = self.frame
+        frame["vertex_lists_created"] += 1
+        frame["vertices_uploaded"] += vertices
+        frame["bytes_uploaded"] += vertices * vertex_size
+
+    def end_frame(self):
+        frame = self.frame
+        for name in self.COUNTERS:
+            self.totals[name] += frame[name]
+        self.frames.append(frame)
+        self.frame_count += 1
+
+        # gauges carry over until they are set again
+        self.frame = {name: 0 for name in self.COUNTERS}
+        self.frame.update((name, frame[name]) for name in self.GAUGES)
+
+    @property
+    def last(self) -> Dict[str, int]:
+        """Counters of the last finished frame."""
+        if not self.frames:
+            return dict.fromkeys(self.COUNTERS + self.GAUGES, 0)
+        return self.frames[-1]
+
+    def series(self, name: str) -> List[int]:
+        return [frame[name] for frame in self.frames]
+
+    def plot(self, graph, name: str):
+        """Push the last frame's value of a counter into a Graph."""
+        graph.push(self.last[name])
+
+    def calculate(self) -> Dict[str, Tuple[float, int, int]]:
+        """Mean, minimum and maximum of every counter over the history."""
+        calculated = {}
+        for name in self.COUNTERS + self.GAUGES:
+            values = self.series(name)
+            if values:
+                calculated[name] = (sum(values) / len(values), min(values), max(values))
+        return calculated
+
+    def show(self):
+        for name, (mean, minimum, maximum) in self.calculate().items():
+            print(f"    {name}: {mean:.2f} ({minimum:d} min) ({maximum:d} max)")
+
+    def dump(self, path: str):
+        """Write the frame history as CSV, or as JSON with the totals if the path ends in .json."""
+        names = self.COUNTERS + self.GAUGES
+        first = self.frame_count - len(self.frames)
+
+        if path.endswith(".json"):
+            with open(path, 'w') as file:
+                json.dump({
+                    "frames": self.frame_count,
+                    "totals": self.totals,
+                    "history": [
+                        dict(frame=first + i, **frame) for i, frame in enumerate(self.frames)
+                    ],
+                }, file)
+        else:
+            with open(path, 'w', newline='') as file:
+                writer = csv.writer(file)
+                writer.writerow(("frame",) + names)
+                for i, frame in enumerate(self.frames):
+                    writer.writerow([first + i] + [frame[name] for name in names])
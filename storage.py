@@ -0,0 +1,254 @@
+from struct import Struct
+from typing import List, Dict, Optional
+
+import numpy as np
+
+
+class BlockStorage:
+    """
+    Compressed storage for the integer keys of a chunk's blocks.
+
+    Blocks are kept as indices into a palette of distinct keys. A chunk
+    made of a single key stores no indices at all (one run covering the
+    whole chunk), otherwise indices are bit-packed into bytes at 1, 2, 4
+    or 8 bits each. The index width is promoted automatically when the
+    palette grows, and once it outgrows 8 bits the keys are stored
+    directly at full width.
+    """
+
+    __slots__ = ['size', 'bits', 'palette', '_lookup', 'data', 'modified']
+
+    UNIFORM = 0
+    PACKED = 1
+    RLE = 2
+    DIRECT = 3
+
+    HEADER = Struct('<BBHH')  # mode, bits, size, palette length
+
+    def __init__(self, size: int = 256, fill: int = 0):
+        self.size = size
+        self.bits = 0
+        self.palette: List[int] = [fill]
+        self._lookup: Dict[int, int] = {fill: 0}
+        self.data: Optional[np.ndarray] = None
+        self.modified = False
+
+    def __repr__(self):
+        return (
+            f"BlockStorage(size={self.size:d}, bits={self.bits:d}, "
+            f"palette={len(self.palette):d}, nbytes={self.nbytes:d})"
+        )
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def mode(self) -> int:
+        if self.bits == 0:
+            return self.UNIFORM
+        elif self.bits > 8:
+            return self.DIRECT
+        return self.PACKED
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the block data, not counting Python overhead."""
+        data = 0 if self.data is None else self.data.nbytes
+        return data + len(self.palette) * 4
+
+    # =========================== accessors ===========================
+    def __getitem__(self, index: int) -> int:
+        bits = self.bits
+        if bits == 0:
+            return self.palette[0]
+        elif bits > 8:
+            return int(self.data[index])
+
+        per = 8 // bits
+        shift = (index % per) * bits
+        return self.palette[(int(self.data[index // per]) >> shift) & ((1 << bits) - 1)]
+
+    def __setitem__(self, index: int, key: int):
+        if not 0 <= index < self.size:
+            raise IndexError(f"block index out of range: {index}")
+
+        if self.bits > 8:
+            self.data[index] = key
+            self.modified = True
+            return
+
+        try:
+            palette_index = self._lookup[key]
+        except KeyError:
+            palette_index = len(self.palette)
+            self.palette.append(key)
+            self._lookup[key] = palette_index
+
+            if palette_index >= (1 << self.bits):
+                self._promote()
+                if self.bits > 8:
+                    self.data[index] = key
+                    self.modified = True
+                    return
+
+        bits = self.bits
+        if bits == 0:
+            # a uniform chunk only hits its palette when the block keeps its key
+            return
+
+        per = 8 // bits
+        shift = (index % per) * bits
+        byte = int(self.data[index // per])
+        self.data[index // per] = (byte & ~(((1 << bits) - 1) << shift)) | (palette_index << shift)
+        self.modified = True
+
+    # ========================= bulk conversion =========================
+    def indices(self) -> np.ndarray:
+        """Unpack the palette index of every block."""
+        bits = self.bits
+        if bits == 0:
+            return np.zeros(self.size, dtype=np.uint16)
+        elif bits > 8:
+            return np.unique(self.data, return_inverse=True)[1].astype(np.uint16)
+
+        per = 8 // bits
+        shifts = np.arange(per, dtype=np.uint8) * bits
+        unpacked = (self.data[:, None] >> shifts) & ((1 << bits) - 1)
+        return unpacked.reshape(-1)[:self.size].astype(np.uint16)
+
+    def keys(self) -> np.ndarray:
+        """Decode every block to its key."""
+        if self.bits > 8:
+            return self.data.astype(np.int64)
+        return np.asarray(self.palette, dtype=np.int64)[self.indices()]
+
+    @classmethod
+    def from_keys(cls, keys) -> "BlockStorage":
+        keys = np.asarray(keys, dtype=np.int64).reshape(-1)
+        palette, inverse = np.unique(keys, return_inverse=True)
+        return cls._from_palette(len(keys), palette.tolist(), inverse)
+
+    @classmethod
+    def _from_palette(cls, size: int, palette: List[int], indices: np.ndarray) -> "BlockStorage":
+        storage = cls(size, palette[0])
+        storage.palette = palette
+        storage._lookup = {key: i for i, key in enumerate(palette)}
+        storage.bits = cls._bits_for(len(palette))
+        storage._pack(indices)
+        return storage
+
+    @staticmethod
+    def _bits_for(count: int) -> int:
+        if count <= 1:
+            return 0
+        for bits in (1, 2, 4, 8):
+            if count <= (1 << bits):
+                return bits
+        return 32
+
+    def _pack(self, indices: np.ndarray):
+        bits = self.bits
+        if bits == 0:
+            self.data = None
+        elif bits > 8:
+            # full width keys make the palette redundant
+            self.data = np.asarray(self.palette, dtype=np.uint32)[indices]
+            self.palette = []
+            self._lookup = {}
+        else:
+            per = 8 // bits
+            padded = np.zeros(-(-self.size // per) * per, dtype=np.uint8)
+            padded[:self.size] = indices
+            shifts = np.arange(per, dtype=np.uint8) * bits
+            self.data = np.bitwise_or.reduce(
+                padded.reshape(-1, per) << shifts, axis=1
+            ).astype(np.uint8)
+
+    def _promote(self):
+        # the new palette entry has already been appended, so unpack with the old width
+        indices = self.indices()
+        self.bits = self._bits_for(len(self.palette))
+        self._pack(indices)
+
+    def compact(self):
+        """
+        Drop palette entries no block refers to any more, demoting the
+        index width (possibly back to a single run) where it can.
+        """
+        keys = self.keys()
+        compacted = self.from_keys(keys)
+        self.bits = compacted.bits
+        self.palette = compacted.palette
+        self._lookup = compacted._lookup
+        self.data = compacted.data
+
+    # ========================= serialization =========================
+    def to_bytes(self) -> bytes:
+        """
+        Serialize the storage. Uniform chunks are written as their single
+        key, and chunks made of long runs are run-length encoded when that
+        is smaller than the packed indices.
+        """
+        self.compact()
+        palette = np.asarray(self.palette, dtype='<u4').tobytes()
+
+        if self.bits == 0:
+            return self.HEADER.pack(self.UNIFORM, 0, self.size, 1) + palette
+        elif self.bits > 8:
+            return (
+                self.HEADER.pack(self.DIRECT, 32, self.size, 0)
+                + self.data.astype('<u4').tobytes()
+            )
+
+        indices = self.indices()
+        starts = np.flatnonzero(np.diff(indices.astype(np.int32), prepend=-1))
+        if len(starts) * 3 < self.data.nbytes:
+            lengths = np.diff(starts, append=self.size).astype('<u2')
+            return (
+                self.HEADER.pack(self.RLE, self.bits, self.size, len(self.palette))
+                + palette
+                + indices[starts].astype(np.uint8).tobytes()
+                + lengths.tobytes()
+            )
+
+        return (
+            self.HEADER.pack(self.PACKED, self.bits, self.size, len(self.palette))
+            + palette
+            + self.data.tobytes()
+        )
+
+    @classmethod
+    def from_bytes(cls, buffer: bytes) -> "BlockStorage":
+        mode, bits, size, count = cls.HEADER.unpack_from(buffer)
+        offset = cls.HEADER.size
+
+        if mode == cls.DIRECT:
+            keys = np.frombuffer(buffer, dtype='<u4', count=size, offset=offset)
+            storage = cls(size)
+            storage.palette = []
+            storage._lookup = {}
+            storage.bits = bits
+            storage.data = keys.astype(np.uint32)
+            return storage
+
+        palette = np.frombuffer(buffer, dtype='<u4', count=count, offset=offset).tolist()
+        offset += count * 4
+
+        if mode == cls.UNIFORM:
+            return cls(size, palette[0])
+        elif mode == cls.RLE:
+            runs = (len(buffer) - offset) // 3
+            values = np.frombuffer(buffer, dtype=np.uint8, count=runs, offset=offset)
+            lengths = np.frombuffer(buffer, dtype='<u2', count=runs, offset=offset + runs)
+            return cls._from_palette(size, palette, np.repeat(values, lengths))
+        elif mode == cls.PACKED:
+            storage = cls(size, palette[0])
+            storage.palette = palette
+            storage._lookup = {key: i for i, key in enumerate(palette)}
+            storage.bits = bits
+            storage.data = np.frombuffer(
+                buffer, dtype=np.uint8, count=-(-size * bits // 8), offset=offset
+            ).copy()
+            return storage
+
+        raise ValueError(f"unknown block storage mode: {mode}")
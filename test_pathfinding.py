@@ -0,0 +1,111 @@
+from collections import deque
+from random import Random
+
+from common import block_index, CHUNK_WIDTH
+from pathfinding import Pathfinder, STEPS
+
+
+def is_open(grid, cell) -> bool:
+    name = grid.locate(cell)
+    if name is None:
+        return False
+    return grid[name][block_index(cell[0] % CHUNK_WIDTH, cell[1] % CHUNK_WIDTH)].broken
+
+
+def set_broken(grid, cell, broken: bool):
+    name = grid.locate(cell)
+    index = block_index(cell[0] % CHUNK_WIDTH, cell[1] % CHUNK_WIDTH)
+    block = grid[name][index]
+    block.broken = broken
+    grid[name][index] = block
+
+
+def distances(grid, start) -> dict:
+    """Flat breadth first search over every block of the world."""
+    found = {start: 0}
+    queue = deque([start])
+    while queue:
+        x, y = cell = queue.popleft()
+        for dx, dy in STEPS:
+            other = (x + dx, y + dy)
+            if other not in found and is_open(grid, other):
+                found[other] = found[cell] + 1
+                queue.append(other)
+    return found
+
+
+def check(grid, start, goal, path):
+    distance = distances(grid, start).get(goal)
+    if distance is None:
+        assert path is None
+        return
+
+    assert path is not None and len(path) >= distance
+    previous = start
+    for cell in path:
+        assert abs(cell[0] - previous[0]) + abs(cell[1] - previous[1]) == 1
+        assert is_open(grid, cell)
+        previous = cell
+    assert previous == goal
+
+
+def open_cells(grid):
+    width = grid.columns * CHUNK_WIDTH
+    height = grid.rows * CHUNK_WIDTH
+    return [(x, y) for x in range(width) for y in range(height) if is_open(grid, (x, y))]
+
+
+def test_paths_match_bfs(world):
+    grid = world(seed=4)
+    pathfinder = Pathfinder(grid)
+    rng = Random(1)
+    cells = open_cells(grid)
+
+    queries = [(rng.choice(cells), rng.choice(cells)) for _ in range(100)]
+    for (start, goal), path in zip(queries, pathfinder.find_paths(queries)):
+        check(grid, start, goal, path)
+    for start, goal in queries[:20]:
+        check(grid, start, goal, pathfinder.find_path(start, goal))
+
+    assert pathfinder.find_path(cells[0], cells[0]) == []
+
+
+def test_closed_or_outside_cells(world):
+    grid = world(broken=0.)
+    pathfinder = Pathfinder(grid)
+    assert pathfinder.find_path((0, 0), (1, 0)) is None
+    assert pathfinder.find_path((-1, 0), (1, 0)) is None
+
+
+def test_invalidation_after_broken_write(world):
+    grid = world(broken=0.)
+    pathfinder = Pathfinder(grid)
+
+    # two open blocks walled off from each other by the last block of chunk 0
+    start, wall, goal = (14, 3), (15, 3), (16, 3)
+    set_broken(grid, start, True)
+    set_broken(grid, goal, True)
+    assert pathfinder.find_path(start, goal) is None
+
+    set_broken(grid, wall, True)
+    assert pathfinder.find_path(start, goal) == [wall, goal]
+
+    set_broken(grid, wall, False)
+    assert pathfinder.find_path(start, goal) is None
+
+
+def test_paths_after_random_edits(world):
+    grid = world(seed=7)
+    pathfinder = Pathfinder(grid)
+    rng = Random(2)
+    width = grid.columns * CHUNK_WIDTH
+
+    for _ in range(10):
+        for _ in range(20):
+            cell = (rng.randrange(width), rng.randrange(width))
+            set_broken(grid, cell, not is_open(grid, cell))
+
+        cells = open_cells(grid)
+        queries = [(rng.choice(cells), rng.choice(cells)) for _ in range(30)]
+        for (start, goal), path in zip(queries, pathfinder.find_paths(queries)):
+            check(grid, start, goal, path)
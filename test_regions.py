@@ -0,0 +1,100 @@
+from collections import deque
+from random import Random
+
+import pytest
+
+from common import block_index, CHUNK_WIDTH
+from regions import RegionLabels, OPEN
+
+
+def block_class(grid, cell) -> int:
+    block = grid[grid.locate(cell)][block_index(cell[0] % CHUNK_WIDTH, cell[1] % CHUNK_WIDTH)]
+    return OPEN if block.broken else block.value
+
+
+def flood(grid, start) -> set:
+    """Cells 4-connected to start through blocks of its class, searched block by block."""
+    kind = block_class(grid, start)
+    found = {start}
+    queue = deque([start])
+    while queue:
+        x, y = queue.popleft()
+        for other in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+            if (
+                other not in found and grid.locate(other) is not None
+                and block_class(grid, other) == kind
+            ):
+                found.add(other)
+                queue.append(other)
+    return found
+
+
+def check(grid, regions, cells):
+    for cell in cells:
+        expected = flood(grid, cell)
+        assert regions.region_class(cell) == block_class(grid, cell)
+        assert regions.region_size(cell) == len(expected)
+        assert set(regions.cells(cell)) == expected
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_regions_match_flood_fill(world, workers):
+    grid = world(size=4, broken=0.3, values=2, seed=3, workers=workers)
+    regions = RegionLabels(grid)
+    rng = Random(workers)
+    width = grid.columns * CHUNK_WIDTH
+
+    check(grid, regions, [(rng.randrange(width), rng.randrange(width)) for _ in range(30)])
+
+    # breaking a block makes it part of a cavern, whichever storage holds it
+    block = grid[0][0]
+    block.broken = True
+    grid[0][0] = block
+    assert regions.region_class((0, 0)) == OPEN
+    check(grid, regions, [(0, 0)])
+
+
+def check_all(grid, regions):
+    """Compare every region of the world with a flood fill."""
+    width = grid.columns * CHUNK_WIDTH
+    height = grid.rows * CHUNK_WIDTH
+    seen = set()
+    ids = set()
+    for start in ((x, y) for x in range(width) for y in range(height)):
+        if start in seen:
+            continue
+        expected = flood(grid, start)
+        seen |= expected
+
+        region = regions.region(start)
+        assert region not in ids
+        ids.add(region)
+        assert regions.region_size(start) == len(expected)
+        assert set(regions.cells(start)) == expected
+        assert all(regions.region(cell) == region for cell in expected)
+
+    # regions dissolved by earlier refreshes are forgotten
+    assert regions.members.keys() == ids
+
+
+def test_regions_after_random_edits(world):
+    grid = world(size=4, broken=0.3, values=2, seed=7)
+    regions = RegionLabels(grid)
+    rng = Random(1)
+    width = grid.columns * CHUNK_WIDTH
+
+    check_all(grid, regions)
+    for _ in range(30):
+        # a few edits between refreshes, half of them along chunk borders
+        for _ in range(rng.randrange(1, 4)):
+            if rng.random() < 0.5:
+                cell = (rng.randrange(width), rng.randrange(width))
+            else:
+                cell = (rng.randrange(1, grid.columns) * CHUNK_WIDTH - rng.randrange(2), rng.randrange(width))
+            name = grid.locate(cell)
+            index = block_index(cell[0] % CHUNK_WIDTH, cell[1] % CHUNK_WIDTH)
+            block = grid[name][index]
+            block.broken = not block.broken
+            grid[name][index] = block
+
+        check_all(grid, regions)
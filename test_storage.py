@@ -0,0 +1,111 @@
+from random import Random
+
+import numpy as np
+import pytest
+
+from storage import BlockStorage
+
+
+def random_keys(distinct: int, seed: int = 0):
+    rng = Random(seed)
+    return [rng.randrange(distinct) * 2 for _ in range(256)]
+
+
+def direct_storage() -> BlockStorage:
+    # more keys than fit in a byte-wide palette have passed through the chunk
+    storage = BlockStorage(256, 0)
+    for key in range(300):
+        storage[key % 256] = key
+    return storage
+
+
+STORAGES = {
+    "uniform": [4] * 256,
+    "packed": random_keys(3),
+    "rle": [2] * 100 + [6] * 156,
+    "direct": direct_storage().keys().tolist(),
+}
+
+
+def build(name: str) -> BlockStorage:
+    if name == "direct":
+        storage = direct_storage()
+        assert storage.mode == BlockStorage.DIRECT
+        return storage
+    return BlockStorage.from_keys(STORAGES[name])
+
+
+@pytest.mark.parametrize("name", STORAGES)
+def test_round_trip(name):
+    keys = STORAGES[name]
+    storage = build(name)
+    assert storage.keys().tolist() == keys
+    assert [storage[i] for i in range(256)] == keys
+
+    restored = BlockStorage.from_bytes(storage.to_bytes())
+    assert restored.keys().tolist() == keys
+
+
+def test_serialized_modes():
+    def mode(storage: BlockStorage) -> int:
+        return BlockStorage.HEADER.unpack_from(storage.to_bytes())[0]
+
+    assert mode(build("uniform")) == BlockStorage.UNIFORM
+    assert mode(build("packed")) == BlockStorage.PACKED
+    assert mode(build("rle")) == BlockStorage.RLE
+    # only a palette wider than a byte after compaction is written at full width
+    assert mode(BlockStorage.from_keys(range(300))) == BlockStorage.DIRECT
+    assert BlockStorage.from_bytes(
+        BlockStorage.from_keys(range(300)).to_bytes()
+    ).keys().tolist() == list(range(300))
+
+
+@pytest.mark.parametrize("name", STORAGES)
+@pytest.mark.parametrize("reload", [False, True])
+def test_writes(name, reload):
+    rng = Random(1)
+    storage = build(name)
+    if reload:
+        storage = BlockStorage.from_bytes(storage.to_bytes())
+    expected = list(STORAGES[name])
+
+    # rewriting the current key must be a no-op, whatever the mode
+    storage[3] = expected[3]
+    assert storage.keys().tolist() == expected
+
+    for _ in range(2000):
+        index, key = rng.randrange(256), rng.randrange(40) * 2
+        storage[index] = key
+        expected[index] = key
+        assert storage[index] == key
+
+    assert storage.keys().tolist() == expected
+    assert BlockStorage.from_bytes(storage.to_bytes()).keys().tolist() == expected
+
+
+def test_uniform_write_same_key():
+    storage = BlockStorage(256, 0)
+    storage[0] = 0
+    assert storage.bits == 0
+    assert not storage.modified
+
+
+def test_promotion_and_compaction():
+    storage = BlockStorage(256, 0)
+    expected = [0] * 256
+    for key in range(1, 300):
+        storage[key % 256] = key
+        expected[key % 256] = key
+        assert storage.keys().tolist() == expected
+    assert storage.mode == BlockStorage.DIRECT
+
+    for index in range(256):
+        storage[index] = 7
+    storage.compact()
+    assert storage.mode == BlockStorage.UNIFORM
+    assert np.all(storage.keys() == 7)
+
+
+def test_out_of_range():
+    with pytest.raises(IndexError):
+        BlockStorage()[256] = 1